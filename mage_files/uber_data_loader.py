@@ -1,4 +1,4 @@
-import pandas as pd
+import duckdb
 from pathlib import Path
 import os
 
@@ -11,16 +11,11 @@ def load_data_from_file():
     project_root = current_dir.parent
     jan_data_path = project_root / 'data' / 'raw' / 'yellow_tripdata_2024-01.parquet'
     feb_data_path = project_root / 'data' / 'raw' / 'yellow_tripdata_2024-02.parquet'
-    
+
     # Validate files exist
     if not jan_data_path.exists() or not feb_data_path.exists():
         raise FileNotFoundError(f"Data files not found at {jan_data_path} or {feb_data_path}")
-    
-    # Read and combine the Parquet files
-    df_jan = pd.read_parquet(jan_data_path)
-    df_feb = pd.read_parquet(feb_data_path)
-    df = pd.concat([df_jan, df_feb], ignore_index=True)
-    
+
     # Rename columns to match our pipeline
     column_mapping = {
         'tpep_pickup_datetime': 'pickup_datetime',
@@ -34,35 +29,42 @@ def load_data_from_file():
         'tip_amount': 'tip_amount',
         'total_amount': 'total_amount'
     }
-    
-    df = df.rename(columns=column_mapping)
-    
-    # Select and reorder columns we need
-    required_columns = [
-        'pickup_datetime',
-        'dropoff_datetime',
-        'passenger_count',
-        'trip_distance',
-        'pickup_location_id',
-        'dropoff_location_id',
-        'payment_type',
-        'fare_amount',
-        'tip_amount',
-        'total_amount'
-    ]
-    
-    # Validate all required columns are present
-    missing_columns = [col for col in required_columns if col not in df.columns]
-    if missing_columns:
-        raise ValueError(f"Missing required columns: {missing_columns}")
-    
-    return df[required_columns]
+
+    # Narrow numeric types; counts fit in int8 and amounts in float32
+    column_types = {
+        'passenger_count': 'TINYINT',
+        'trip_distance': 'REAL',
+        'fare_amount': 'REAL',
+        'tip_amount': 'REAL',
+        'total_amount': 'REAL'
+    }
+
+    source = f"read_parquet(['{jan_data_path}', '{feb_data_path}'])"
+    conn = duckdb.connect()
+
+    try:
+        # Validate all required columns are present using only the Parquet schema
+        available_columns = [
+            row[0] for row in conn.execute(f"DESCRIBE SELECT * FROM {source} LIMIT 0").fetchall()
+        ]
+        missing_columns = [col for col in column_mapping if col not in available_columns]
+        if missing_columns:
+            raise ValueError(f"Missing required columns: {missing_columns}")
+
+        # Read, combine, rename and project both files in a single scan
+        select_list = ', '.join(
+            f'CAST("{src}" AS {column_types[dst]}) AS {dst}' if dst in column_types else f'"{src}" AS {dst}'
+            for src, dst in column_mapping.items()
+        )
+        return conn.execute(f"SELECT {select_list} FROM {source}").fetch_arrow_table()
+    finally:
+        conn.close()
 
 if __name__ == "__main__":
     # Load and display sample of the data
-    df = load_data_from_file()
-    print("\nDataset Shape:", df.shape)
+    table = load_data_from_file()
+    print("\nDataset Shape:", table.shape)
     print("\nSample Data:")
-    print(df.head())
+    print(table.slice(0, 5).to_pandas())
     print("\nColumn Info:")
-    print(df.info())
+    print(table.schema)
@@ -1,118 +1,131 @@
 from mage_ai.data_preparation.decorators import transformer
 from mage_ai.data_preparation.utils import get_repo_path
-from pandas import DataFrame
-import pandas as pd
-import numpy as np
+import pyarrow as pa
 from datetime import datetime
 from pathlib import Path
+from src.etl.db import get_conn
+from src.etl.extract import load_staging_from_pandas
 import duckdb
 
 @transformer
-def transform_data(df: DataFrame, *args, **kwargs) -> DataFrame:
+def transform_data(df: pa.Table, *args, **kwargs) -> pa.Table:
     """
     Transform the raw Uber data into dimensional model format
     """
-    # Create DuckDB connection
-    db_path = Path(get_repo_path()) / 'uber_rides.db'
-    conn = duckdb.connect(str(db_path))
+    # Reuse the pipeline's DuckDB connection to the repo database
+    conn = get_conn(Path(get_repo_path()) / 'uber_rides.db')
     
-    try:
-        # 1. Clean and prepare datetime data
-        df['pickup_datetime'] = pd.to_datetime(df['pickup_datetime'])
-        df['dropoff_datetime'] = pd.to_datetime(df['dropoff_datetime'])
-        df['trip_duration'] = (df['dropoff_datetime'] - df['pickup_datetime']).dt.total_seconds()
-        
-        # 2. Create dimension tables
-        
-        # dim_datetime
-        dim_datetime = pd.DataFrame({
-            'datetime_id': range(len(df)),
-            'pickup_datetime': df['pickup_datetime'],
-            'pickup_hour': df['pickup_datetime'].dt.hour,
-            'pickup_day': df['pickup_datetime'].dt.day,
-            'pickup_month': df['pickup_datetime'].dt.month,
-            'pickup_year': df['pickup_datetime'].dt.year,
-            'pickup_weekday': df['pickup_datetime'].dt.weekday
-        })
-        
-        # dim_location
-        dim_location = pd.DataFrame({
-            'location_id': range(len(df)),
-            'pickup_location_id': df['pickup_location_id'],
-            'dropoff_location_id': df['dropoff_location_id']
-        })
-        
-        # dim_payment
-        unique_payments = df['payment_type'].unique()
-        dim_payment = pd.DataFrame({
-            'payment_id': range(len(unique_payments)),
-            'payment_name': unique_payments
-        })
-        
-        # dim_passenger
-        unique_passenger_counts = df['passenger_count'].unique()
-        dim_passenger = pd.DataFrame({
-            'passenger_id': range(len(unique_passenger_counts)),
-            'passenger_count': unique_passenger_counts
-        })
-        
-        # 3. Create fact table
-        fact_trips = pd.DataFrame({
-            'trip_id': range(len(df)),
-            'datetime_id': dim_datetime['datetime_id'],
-            'pickup_location_id': df['pickup_location_id'],
-            'dropoff_location_id': df['dropoff_location_id'],
-            'payment_id': df['payment_type'].map(dict(zip(dim_payment['payment_name'], dim_payment['payment_id']))),
-            'passenger_id': df['passenger_count'].map(dict(zip(dim_passenger['passenger_count'], dim_passenger['passenger_id']))),
-            'trip_distance': df['trip_distance'],
-            'trip_duration': df['trip_duration'],
-            'fare_amount': df['fare_amount'],
-            'tip_amount': df['tip_amount'],
-            'total_amount': df['total_amount']
-        })
-        
-        # 4. Load tables into DuckDB
-        conn.execute('DROP TABLE IF EXISTS dim_datetime')
-        conn.execute('DROP TABLE IF EXISTS dim_location')
-        conn.execute('DROP TABLE IF EXISTS dim_payment')
-        conn.execute('DROP TABLE IF EXISTS dim_passenger')
-        conn.execute('DROP TABLE IF EXISTS fact_trips')
-        
-        conn.execute('CREATE TABLE dim_datetime AS SELECT * FROM dim_datetime')
-        conn.execute('CREATE TABLE dim_location AS SELECT * FROM dim_location')
-        conn.execute('CREATE TABLE dim_payment AS SELECT * FROM dim_payment')
-        conn.execute('CREATE TABLE dim_passenger AS SELECT * FROM dim_passenger')
-        conn.execute('CREATE TABLE fact_trips AS SELECT * FROM fact_trips')
-        
-        # 5. Create indexes for better query performance
-        conn.execute('CREATE INDEX idx_datetime_id ON dim_datetime(datetime_id)')
-        conn.execute('CREATE INDEX idx_location_id ON dim_location(location_id)')
-        conn.execute('CREATE INDEX idx_payment_id ON dim_payment(payment_id)')
-        conn.execute('CREATE INDEX idx_passenger_id ON dim_passenger(passenger_id)')
-        conn.execute('CREATE INDEX idx_trip_id ON fact_trips(trip_id)')
-        
-        return fact_trips
-        
-    finally:
-        conn.close()
+    # 1. Stage the raw Arrow data inside DuckDB in one bulk copy
+    load_staging_from_pandas(df, 'uber_rides', conn)
+    
+    # 2. Create dimension and fact tables in DuckDB
+    conn.execute('DROP TABLE IF EXISTS dim_datetime')
+    conn.execute('DROP TABLE IF EXISTS dim_location')
+    conn.execute('DROP TABLE IF EXISTS dim_payment')
+    conn.execute('DROP TABLE IF EXISTS dim_passenger')
+    conn.execute('DROP TABLE IF EXISTS fact_trips')
+    
+    # dim_datetime
+    conn.execute("""
+        CREATE TABLE dim_datetime AS
+        SELECT
+            datetime_id,
+            pickup_datetime,
+            parts.hour::TINYINT AS pickup_hour,
+            parts.day::TINYINT AS pickup_day,
+            parts.month::TINYINT AS pickup_month,
+            parts.year::SMALLINT AS pickup_year,
+            (parts.isodow - 1)::TINYINT AS pickup_weekday
+        FROM (
+            -- Decompose each timestamp once into all of its parts
+            SELECT
+                rowid::INTEGER AS datetime_id,
+                pickup_datetime,
+                date_part(['hour', 'day', 'month', 'year', 'isodow'], pickup_datetime) AS parts
+            FROM staging_uber_rides
+        )
+    """)
+    
+    # dim_location
+    conn.execute("""
+        CREATE TABLE dim_location AS
+        SELECT
+            (row_number() OVER (ORDER BY pickup_location_id, dropoff_location_id) - 1)::INTEGER AS location_id,
+            pickup_location_id,
+            dropoff_location_id
+        FROM (SELECT DISTINCT pickup_location_id, dropoff_location_id FROM staging_uber_rides)
+    """)
+    
+    # dim_payment
+    conn.execute("""
+        CREATE TABLE dim_payment AS
+        SELECT
+            (row_number() OVER (ORDER BY payment_type) - 1)::INTEGER AS payment_id,
+            payment_type AS payment_name
+        FROM (SELECT DISTINCT payment_type FROM staging_uber_rides)
+    """)
+    
+    # dim_passenger
+    conn.execute("""
+        CREATE TABLE dim_passenger AS
+        SELECT
+            (row_number() OVER (ORDER BY passenger_count) - 1)::INTEGER AS passenger_id,
+            passenger_count
+        FROM (SELECT DISTINCT passenger_count FROM staging_uber_rides)
+    """)
+    
+    # 3. Create fact table
+    conn.execute("""
+        CREATE TABLE fact_trips AS
+        SELECT
+            s.rowid::INTEGER AS trip_id,
+            s.rowid::INTEGER AS datetime_id,
+            dl.location_id,
+            dp.payment_id,
+            dq.passenger_id,
+            s.trip_distance,
+            date_diff('second', s.pickup_datetime, s.dropoff_datetime)::INTEGER AS trip_duration,
+            s.fare_amount,
+            s.tip_amount,
+            s.total_amount
+        FROM staging_uber_rides s
+        JOIN dim_location dl ON
+            s.pickup_location_id IS NOT DISTINCT FROM dl.pickup_location_id AND
+            s.dropoff_location_id IS NOT DISTINCT FROM dl.dropoff_location_id
+        JOIN dim_payment dp ON s.payment_type IS NOT DISTINCT FROM dp.payment_name
+        JOIN dim_passenger dq ON s.passenger_count IS NOT DISTINCT FROM dq.passenger_count
+    """)
+    
+    return conn.execute('SELECT * FROM fact_trips').fetch_arrow_table()
 
 @transformer
-def validate_transformed_data(df: DataFrame, *args, **kwargs) -> DataFrame:
+def validate_transformed_data(df: pa.Table, *args, **kwargs) -> pa.Table:
     """
     Validate the transformed data
     """
-    # Validate no null values in key fields
-    key_fields = ['trip_id', 'datetime_id', 'pickup_location_id', 'dropoff_location_id', 'payment_id', 'passenger_id']
-    null_counts = df[key_fields].isnull().sum()
-    if null_counts.any():
-        raise ValueError(f"Found null values in key fields: {null_counts[null_counts > 0].to_dict()}")
+    # Validate no null values in key fields (Arrow tracks null counts per column)
+    key_fields = ['trip_id', 'datetime_id', 'location_id', 'payment_id', 'passenger_id']
+    null_counts = {field: df.column(field).null_count for field in key_fields}
+    null_fields = {field: count for field, count in null_counts.items() if count > 0}
+    if null_fields:
+        raise ValueError(f"Found null values in key fields: {null_fields}")
+    
+    # Validate numeric ranges with a single scan over the Arrow table
+    conn = duckdb.connect()
+    try:
+        conn.register('fact_trips', df)
+        min_distance, min_duration, min_fare = conn.execute("""
+            SELECT MIN(trip_distance), MIN(trip_duration), MIN(fare_amount)
+            FROM fact_trips
+        """).fetchone()
+    finally:
+        conn.close()
     
-    # Validate numeric ranges
-    if (df['trip_distance'] < 0).any():
+    if min_distance is not None and min_distance < 0:
         raise ValueError("Found negative trip distances")
-    if (df['trip_duration'] < 0).any():
+    if min_duration is not None and min_duration < 0:
         raise ValueError("Found negative trip durations")
-    if (df['fare_amount'] < 0).any():
+    if min_fare is not None and min_fare < 0:
         raise ValueError("Found negative fare amounts")
     
     return df
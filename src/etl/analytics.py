@@ -0,0 +1,121 @@
+from pathlib import Path
+import functools
+import orjson
+import pyarrow.feather as feather
+
+# Views exported by both src/etl/load.py and the Mage exporter
+ANALYTICS_VIEWS = [
+    'vw_hourly_fares',
+    'vw_popular_locations',
+    'vw_payment_analysis',
+    'vw_daily_stats'
+]
+
+NUMERIC_TYPES = {
+    'TINYINT', 'SMALLINT', 'INTEGER', 'BIGINT', 'HUGEINT',
+    'UTINYINT', 'USMALLINT', 'UINTEGER', 'UBIGINT',
+    'FLOAT', 'DOUBLE', 'DECIMAL'
+}
+
+STATS = ('min', 'max', 'mean', 'median')
+
+@functools.lru_cache(maxsize=None)
+def _stats_query(relation: str, names: tuple, numeric: tuple) -> str:
+    """Build the single-scan statistics query for a relation"""
+    # One aggregate per statistic, all projected from the same scan
+    aggregates = ['COUNT(*)']
+    aggregates += [f'COUNT(*) - COUNT("{name}")' for name in names]
+    for name in numeric:
+        aggregates += [f'MIN("{name}")', f'MAX("{name}")', f'AVG("{name}")', f'MEDIAN("{name}")']
+    return f"SELECT {', '.join(aggregates)} FROM {relation}"
+
+def compute_view_stats(conn, view: str) -> dict:
+    """Compute basic statistics for a view in a single DuckDB scan"""
+    columns = [(row[0], row[1].split('(')[0]) for row in conn.execute(f"DESCRIBE {view}").fetchall()]
+    names = tuple(name for name, _ in columns)
+    numeric = tuple(name for name, column_type in columns if column_type in NUMERIC_TYPES)
+    row = conn.execute(_stats_query(view, names, numeric)).fetchone()
+
+    null_counts = dict(zip(names, row[1:1 + len(names)]))
+    values = iter(row[1 + len(names):])
+    numeric_columns = {}
+    for name in numeric:
+        numeric_columns[name] = {stat: next(values) for stat in STATS}
+
+    return {
+        'row_count': row[0],
+        'columns': list(names),
+        'null_counts': null_counts,
+        'numeric_columns': numeric_columns
+    }
+
+def export_view(conn, view: str, output_dir, fmt: str = 'parquet') -> dict:
+    """Export a view to Parquet or Arrow IPC and return its statistics.
+
+    The view is read into Arrow once; both the export and the statistics
+    run against that table instead of scanning the view twice.
+    """
+    if fmt not in ('parquet', 'arrow'):
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    table = conn.execute(f"SELECT * FROM {view}").fetch_arrow_table()
+    path = Path(output_dir) / f"{view}.{fmt}"
+
+    relation = f"{view}_export"
+    conn.register(relation, table)
+    try:
+        if fmt == 'parquet':
+            conn.execute(f"""
+                COPY {relation} TO '{path}'
+                (FORMAT PARQUET, COMPRESSION ZSTD, ROW_GROUP_SIZE 100000)
+            """)
+        else:
+            # Uncompressed so consumers can memory-map it
+            feather.write_feather(table, path, compression='uncompressed')
+        return compute_view_stats(conn, relation)
+    finally:
+        conn.unregister(relation)
+
+def build_summary(conn) -> dict:
+    """Build the overall trip and payment summary"""
+    summary = {}
+
+    # Total trips and revenue
+    result = conn.execute("""
+        SELECT
+            COUNT(*) as total_trips,
+            SUM(total_amount) as total_revenue,
+            AVG(trip_distance) as avg_distance,
+            AVG(trip_duration)/60 as avg_duration_minutes
+        FROM fact_trips
+    """).fetchone()
+
+    summary['overall_stats'] = {
+        'total_trips': result[0],
+        'total_revenue': round(float(result[1]), 2),
+        'avg_distance': round(float(result[2]), 2),
+        'avg_duration_minutes': round(float(result[3]), 2)
+    }
+
+    # Payment type distribution
+    payment_rows = conn.execute("""
+        SELECT
+            p.payment_name,
+            COUNT(*) as trip_count,
+            ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM fact_trips), 2) as percentage
+        FROM fact_trips f
+        JOIN dim_payment p ON f.payment_id = p.payment_id
+        GROUP BY p.payment_name
+        ORDER BY trip_count DESC
+    """).fetchall()
+    summary['payment_distribution'] = [
+        {'payment_name': name, 'trip_count': count, 'percentage': percentage}
+        for name, count, percentage in payment_rows
+    ]
+
+    return summary
+
+def write_json(path, data):
+    """Write data as indented JSON"""
+    with open(path, 'wb') as f:
+        f.write(orjson.dumps(data, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
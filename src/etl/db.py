@@ -0,0 +1,50 @@
+import duckdb
+from pathlib import Path
+import atexit
+import tempfile
+
+# Default database at the project root, used by the ETL scripts
+DB_PATH = Path(__file__).resolve().parents[2] / 'uber_rides.db'
+
+# Explicit engine settings instead of host-dependent defaults; the pipeline only
+# appends, so insertion order need not be preserved and inserts can run in parallel
+DUCKDB_CONFIG = {
+    'threads': 8,
+    'memory_limit': '8GB',
+    'preserve_insertion_order': False,
+    'temp_directory': str(Path(tempfile.gettempdir()) / 'duckdb_tmp')
+}
+
+# One connection per database file, opened on first use
+_CONNS = {}
+
+def get_conn(path=None):
+    """Return the process-wide DuckDB connection for a database, opening it on first use.
+
+    Defaults to the ETL database; the Mage blocks pass their own repo's database.
+    """
+    db_path = str(path or DB_PATH)
+    if db_path not in _CONNS:
+        _CONNS[db_path] = duckdb.connect(db_path, config=DUCKDB_CONFIG)
+    return _CONNS[db_path]
+
+def close_conn():
+    """Close every process-wide DuckDB connection"""
+    while _CONNS:
+        _, conn = _CONNS.popitem()
+        conn.close()
+
+atexit.register(close_conn)
+
+def drop_relation(conn, name: str):
+    """Drop a persistent table or view by name, whichever kind currently exists"""
+    # Qualify with the database so a TEMP object of the same name is never picked up
+    row = conn.execute(
+        "SELECT table_catalog, table_type FROM information_schema.tables "
+        "WHERE table_catalog = current_database() AND table_schema = 'main' AND table_name = ?",
+        [name]
+    ).fetchone()
+    if row:
+        catalog, table_type = row
+        kind = 'VIEW' if table_type == 'VIEW' else 'TABLE'
+        conn.execute(f'DROP {kind} "{catalog}".main.{name}')
@@ -1,7 +1,8 @@
 import duckdb
-import pandas as pd
-from pathlib import Path
+import glob
 import logging
+from pathlib import Path
+from src.etl.db import drop_relation, get_conn
 
 # Set up logging
 logging.basicConfig(
@@ -10,56 +11,74 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def connect_to_duckdb():
-    """Create or connect to DuckDB database"""
-    return duckdb.connect('uber_rides.db')
-
 def initialize_database(conn):
     """Initialize database with schema"""
     try:
         with open('src/models/dimensional_models.sql', 'r') as f:
-            sql_commands = f.read()
-            # Split commands by semicolon and execute each
-            for command in sql_commands.split(';'):
-                if command.strip():
-                    conn.execute(command)
+            # DuckDB runs the whole multi-statement script in one call
+            conn.execute(f.read())
         logger.info("Database schema initialized successfully")
     except Exception as e:
         logger.error(f"Error initializing database: {str(e)}")
         raise
 
-def load_csv_to_duckdb(file_path: str, table_name: str):
-    """Load CSV file into DuckDB staging table"""
-    conn = connect_to_duckdb()
+def drop_staging(conn, table_name: str):
+    """Drop the staging relation, whether it is currently a table or a view"""
+    drop_relation(conn, f"staging_{table_name}")
+
+def load_parquet_to_duckdb(file_glob: str, table_name: str):
+    """Expose Parquet files to DuckDB as a staging view"""
+    conn = get_conn()
     
     try:
-        # Create staging table
+        # Scan the compressed columnar files in place instead of copying them into the database
+        drop_staging(conn, table_name)
         conn.execute(f"""
-            CREATE TABLE IF NOT EXISTS staging_{table_name} AS 
-            SELECT * FROM read_csv_auto('{file_path}')
+            CREATE VIEW staging_{table_name} AS 
+            SELECT * FROM read_parquet('{Path(file_glob).resolve()}')
         """)
         
         # Get row count
         row_count = conn.execute(f"SELECT COUNT(*) FROM staging_{table_name}").fetchone()[0]
         logger.info(f"Successfully loaded {row_count} rows into staging_{table_name}")
         
-        # Initialize schema
-        initialize_database(conn)
-        
+    except Exception as e:
+        logger.error(f"Error loading data: {str(e)}")
+        raise
+
+def load_staging_from_pandas(df, table_name: str = 'uber_rides', conn=None):
+    """Load an in-memory DataFrame or Arrow table into a DuckDB staging table in one bulk copy"""
+    conn = conn or get_conn()
+
+    try:
+        # Register the frame and copy it column-wise rather than row by row
+        conn.register('staging_df', df)
+        drop_staging(conn, table_name)
+        conn.execute(f"CREATE TABLE staging_{table_name} AS SELECT * FROM staging_df")
+
+        row_count = conn.execute(f"SELECT COUNT(*) FROM staging_{table_name}").fetchone()[0]
+        logger.info(f"Successfully loaded {row_count} rows into staging_{table_name}")
+
     except Exception as e:
         logger.error(f"Error loading data: {str(e)}")
         raise
     finally:
-        conn.close()
+        conn.unregister('staging_df')
 
-def validate_data(file_path: Path):
-    """Validate the input data file"""
-    if not file_path.exists():
-        raise FileNotFoundError(f"Data file not found at {file_path}")
+def validate_data(file_glob: str):
+    """Validate the input data files"""
+    if not glob.glob(file_glob):
+        raise FileNotFoundError(f"Data files not found at {file_glob}")
+    
+    conn = duckdb.connect()
     
     try:
-        # Read first few rows to validate structure
-        df = pd.read_csv(file_path, nrows=5)
+        # Read only the Parquet schema to validate structure
+        columns = [
+            row[0] for row in conn.execute(
+                f"DESCRIBE SELECT * FROM read_parquet('{file_glob}') LIMIT 0"
+            ).fetchall()
+        ]
         required_columns = [
             'pickup_datetime', 'dropoff_datetime',
             'pickup_latitude', 'pickup_longitude',
@@ -69,7 +88,7 @@ def validate_data(file_path: Path):
             'payment_type'
         ]
         
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        missing_columns = [col for col in required_columns if col not in columns]
         if missing_columns:
             raise ValueError(f"Missing required columns: {missing_columns}")
             
@@ -78,18 +97,24 @@ def validate_data(file_path: Path):
     except Exception as e:
         logger.error(f"Data validation failed: {str(e)}")
         raise
+    finally:
+        conn.close()
 
 def main():
     """Execute the extraction process"""
     try:
-        # Path to your data file
-        data_path = Path("data/raw/uber_data.csv")
+        # Path to your data files
+        data_glob = "data/raw/uber_data*.parquet"
         
         # Validate data
-        validate_data(data_path)
+        validate_data(data_glob)
+        
+        # The schema script is idempotent, so run it every time; existing databases
+        # pick up objects and seed rows added since they were created
+        initialize_database(get_conn())
         
         # Load data into staging table
-        load_csv_to_duckdb(str(data_path), "uber_rides")
+        load_parquet_to_duckdb(data_glob, "uber_rides")
         
         logger.info("Extraction process completed successfully")
         
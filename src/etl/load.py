@@ -1,8 +1,7 @@
-import duckdb
-import pandas as pd
 from pathlib import Path
 import logging
-import json
+from src.etl.analytics import ANALYTICS_VIEWS, build_summary, export_view, write_json
+from src.etl.db import drop_relation, get_conn
 
 # Set up logging
 logging.basicConfig(
@@ -11,80 +10,95 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def connect_to_duckdb():
-    """Create or connect to DuckDB database"""
-    return duckdb.connect('uber_rides.db')
-
-def create_analytics_views():
-    """Create views for common analytics queries"""
-    conn = connect_to_duckdb()
-    
+def create_analytics_views(conn):
+    """Create views for common analytics queries on this connection"""
     try:
-        # Average fare by hour of day
+        # Join the fact table to its dimensions once per run; every view aggregates this.
+        # TEMP, so it is rebuilt from the live fact table each run and never persisted.
+        drop_relation(conn, 'trips_enriched')  # left behind by older runs
         conn.execute("""
-            CREATE OR REPLACE VIEW vw_hourly_fares AS
+            CREATE OR REPLACE TEMP TABLE trips_enriched AS
             SELECT 
+                f.trip_distance,
+                f.fare_amount,
+                f.tip_amount,
+                f.total_amount,
+                f.trip_duration,
                 d.pickup_hour,
-                AVG(f.fare_amount) as avg_fare,
-                COUNT(*) as num_trips,
-                AVG(f.tip_amount) as avg_tip,
-                AVG(f.total_amount) as avg_total
+                d.pickup_day,
+                d.pickup_month,
+                d.pickup_year,
+                l.pickup_latitude,
+                l.pickup_longitude,
+                p.payment_name
             FROM fact_trips f
             JOIN dim_datetime d ON f.datetime_id = d.datetime_id
-            GROUP BY d.pickup_hour
-            ORDER BY d.pickup_hour
+            JOIN dim_location l ON f.location_id = l.location_id
+            JOIN dim_payment p ON f.payment_id = p.payment_id
+        """)
+        logger.info("Created enriched trips table")
+
+        # Average fare by hour of day
+        conn.execute("""
+            CREATE OR REPLACE TEMP VIEW vw_hourly_fares AS
+            SELECT 
+                pickup_hour,
+                AVG(fare_amount) as avg_fare,
+                COUNT(*) as num_trips,
+                AVG(tip_amount) as avg_tip,
+                AVG(total_amount) as avg_total
+            FROM trips_enriched
+            GROUP BY pickup_hour
+            ORDER BY pickup_hour
         """)
         logger.info("Created hourly fares view")
 
         # Popular pickup locations
         conn.execute("""
-            CREATE OR REPLACE VIEW vw_popular_locations AS
+            CREATE OR REPLACE TEMP VIEW vw_popular_locations AS
             SELECT 
-                l.pickup_latitude,
-                l.pickup_longitude,
+                ROUND(pickup_latitude, 4) as pickup_latitude,  -- ~11m grid buckets
+                ROUND(pickup_longitude, 4) as pickup_longitude,
                 COUNT(*) as num_pickups,
-                AVG(f.fare_amount) as avg_fare,
-                AVG(f.trip_distance) as avg_distance,
-                AVG(f.trip_duration) as avg_duration
-            FROM fact_trips f
-            JOIN dim_location l ON f.location_id = l.location_id
-            GROUP BY l.pickup_latitude, l.pickup_longitude
+                AVG(fare_amount) as avg_fare,
+                AVG(trip_distance) as avg_distance,
+                AVG(trip_duration) as avg_duration
+            FROM trips_enriched
+            GROUP BY ROUND(pickup_latitude, 4), ROUND(pickup_longitude, 4)
             ORDER BY num_pickups DESC
         """)
         logger.info("Created popular locations view")
 
         # Payment type analysis
         conn.execute("""
-            CREATE OR REPLACE VIEW vw_payment_analysis AS
+            CREATE OR REPLACE TEMP VIEW vw_payment_analysis AS
             SELECT 
-                p.payment_name,
+                payment_name,
                 COUNT(*) as num_trips,
-                AVG(f.fare_amount) as avg_fare,
-                AVG(f.tip_amount) as avg_tip,
-                AVG(f.total_amount) as avg_total,
-                AVG(f.trip_distance) as avg_distance
-            FROM fact_trips f
-            JOIN dim_payment p ON f.payment_id = p.payment_id
-            GROUP BY p.payment_name
+                AVG(fare_amount) as avg_fare,
+                AVG(tip_amount) as avg_tip,
+                AVG(total_amount) as avg_total,
+                AVG(trip_distance) as avg_distance
+            FROM trips_enriched
+            GROUP BY payment_name
         """)
         logger.info("Created payment analysis view")
 
         # Daily statistics
         conn.execute("""
-            CREATE OR REPLACE VIEW vw_daily_stats AS
+            CREATE OR REPLACE TEMP VIEW vw_daily_stats AS
             SELECT 
-                d.pickup_year,
-                d.pickup_month,
-                d.pickup_day,
+                pickup_year,
+                pickup_month,
+                pickup_day,
                 COUNT(*) as num_trips,
-                AVG(f.fare_amount) as avg_fare,
-                SUM(f.total_amount) as total_revenue,
-                AVG(f.trip_distance) as avg_distance,
-                AVG(f.trip_duration) as avg_duration
-            FROM fact_trips f
-            JOIN dim_datetime d ON f.datetime_id = d.datetime_id
-            GROUP BY d.pickup_year, d.pickup_month, d.pickup_day
-            ORDER BY d.pickup_year, d.pickup_month, d.pickup_day
+                AVG(fare_amount) as avg_fare,
+                SUM(total_amount) as total_revenue,
+                AVG(trip_distance) as avg_distance,
+                AVG(trip_duration) as avg_duration
+            FROM trips_enriched
+            GROUP BY pickup_year, pickup_month, pickup_day
+            ORDER BY pickup_year, pickup_month, pickup_day
         """)
         logger.info("Created daily statistics view")
 
@@ -93,108 +107,49 @@ def create_analytics_views():
         raise
 
 def export_analytics(output_dir: str = "data/processed"):
-    """Export analytics views to CSV files"""
-    conn = connect_to_duckdb()
+    """Export analytics views to Parquet files"""
+    conn = get_conn()
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
     
     try:
-        # List of views to export
-        views = [
-            'vw_hourly_fares',
-            'vw_popular_locations',
-            'vw_payment_analysis',
-            'vw_daily_stats'
-        ]
+        # Rebuild the shared join and the views over it for this run
+        create_analytics_views(conn)
         
-        # Export each view
-        for view in views:
-            df = conn.execute(f"SELECT * FROM {view}").fetchdf()
-            csv_path = output_path / f"{view}.csv"
-            df.to_csv(csv_path, index=False)
-            logger.info(f"Exported {view} to {csv_path}")
-            
-            # Generate basic statistics
-            stats = {
-                'row_count': len(df),
-                'columns': list(df.columns),
-                'null_counts': df.isnull().sum().to_dict(),
-                'numeric_columns': {
-                    col: {
-                        'min': float(df[col].min()),
-                        'max': float(df[col].max()),
-                        'mean': float(df[col].mean()),
-                        'median': float(df[col].median())
-                    }
-                    for col in df.select_dtypes(include=['number']).columns
-                }
-            }
+        # Export each view along with its statistics
+        for view in ANALYTICS_VIEWS:
+            stats = export_view(conn, view, output_path, 'parquet')
+            logger.info(f"Exported {view} to {output_path / f'{view}.parquet'}")
             
             # Save statistics
             stats_path = output_path / f"{view}_stats.json"
-            with open(stats_path, 'w') as f:
-                json.dump(stats, f, indent=2, default=str)
+            write_json(stats_path, stats)
             logger.info(f"Exported statistics for {view} to {stats_path}")
     
     except Exception as e:
         logger.error(f"Error exporting analytics: {str(e)}")
         raise
-    finally:
-        conn.close()
 
 def generate_summary_report(output_dir: str = "data/processed"):
     """Generate a summary report of the data"""
-    conn = connect_to_duckdb()
+    conn = get_conn()
     output_path = Path(output_dir)
     
     try:
-        summary = {}
-        
-        # Total trips and revenue
-        result = conn.execute("""
-            SELECT 
-                COUNT(*) as total_trips,
-                SUM(total_amount) as total_revenue,
-                AVG(trip_distance) as avg_distance,
-                AVG(trip_duration)/60 as avg_duration_minutes
-            FROM fact_trips
-        """).fetchone()
-        
-        summary['overall_stats'] = {
-            'total_trips': result[0],
-            'total_revenue': round(float(result[1]), 2),
-            'avg_distance': round(float(result[2]), 2),
-            'avg_duration_minutes': round(float(result[3]), 2)
-        }
-        
-        # Payment type distribution
-        summary['payment_distribution'] = conn.execute("""
-            SELECT 
-                p.payment_name,
-                COUNT(*) as trip_count,
-                ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM fact_trips), 2) as percentage
-            FROM fact_trips f
-            JOIN dim_payment p ON f.payment_id = p.payment_id
-            GROUP BY p.payment_name
-            ORDER BY trip_count DESC
-        """).fetchdf().to_dict('records')
+        summary = build_summary(conn)
         
         # Save summary report
         summary_path = output_path / "summary_report.json"
-        with open(summary_path, 'w') as f:
-            json.dump(summary, f, indent=2)
+        write_json(summary_path, summary)
         logger.info(f"Generated summary report at {summary_path}")
         
     except Exception as e:
         logger.error(f"Error generating summary report: {str(e)}")
         raise
-    finally:
-        conn.close()
 
 def main():
     """Execute all loading steps"""
     try:
-        create_analytics_views()
         export_analytics()
         generate_summary_report()
         logger.info("All loading steps completed successfully")
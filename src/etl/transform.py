@@ -1,6 +1,6 @@
-import duckdb
 import logging
 from datetime import datetime
+from src.etl.db import get_conn
 
 # Set up logging
 logging.basicConfig(
@@ -9,14 +9,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def connect_to_duckdb():
-    """Create or connect to DuckDB database"""
-    return duckdb.connect('uber_rides.db')
-
-def transform_datetime_dimension():
+def transform_datetime_dimension(conn):
     """Transform and load datetime dimension"""
-    conn = connect_to_duckdb()
-    
     try:
         conn.execute("""
             INSERT INTO dim_datetime (
@@ -35,36 +29,101 @@ def transform_datetime_dimension():
                 dropoff_weekday
             )
             SELECT 
-                ROW_NUMBER() OVER () as datetime_id,
+                datetime_id,
                 pickup_datetime,
-                EXTRACT(HOUR FROM pickup_datetime) as pickup_hour,
-                EXTRACT(DAY FROM pickup_datetime) as pickup_day,
-                EXTRACT(MONTH FROM pickup_datetime) as pickup_month,
-                EXTRACT(YEAR FROM pickup_datetime) as pickup_year,
-                EXTRACT(DOW FROM pickup_datetime) as pickup_weekday,
+                pickup_parts.hour as pickup_hour,
+                pickup_parts.day as pickup_day,
+                pickup_parts.month as pickup_month,
+                pickup_parts.year as pickup_year,
+                pickup_parts.dow as pickup_weekday,
                 dropoff_datetime,
-                EXTRACT(HOUR FROM dropoff_datetime) as dropoff_hour,
-                EXTRACT(DAY FROM dropoff_datetime) as dropoff_day,
-                EXTRACT(MONTH FROM dropoff_datetime) as dropoff_month,
-                EXTRACT(YEAR FROM dropoff_datetime) as dropoff_year,
-                EXTRACT(DOW FROM dropoff_datetime) as dropoff_weekday
-            FROM staging_uber_rides
+                dropoff_parts.hour as dropoff_hour,
+                dropoff_parts.day as dropoff_day,
+                dropoff_parts.month as dropoff_month,
+                dropoff_parts.year as dropoff_year,
+                dropoff_parts.dow as dropoff_weekday
+            FROM (
+                -- Timestamp parts were decomposed once in staging_enriched
+                SELECT DISTINCT ON (datetime_id)
+                    datetime_id,
+                    pickup_datetime,
+                    dropoff_datetime,
+                    pickup_parts,
+                    dropoff_parts
+                FROM staging_enriched
+            )
         """)
         logger.info("Successfully transformed datetime dimension")
     except Exception as e:
         logger.error(f"Error transforming datetime dimension: {str(e)}")
         raise
-    finally:
-        conn.close()
 
-def transform_location_dimension():
+def clear_fact_table(conn):
+    """Remove the previous run's facts so the transform is a full reload"""
+    try:
+        conn.execute("DELETE FROM fact_trips")
+        logger.info("Successfully cleared fact table")
+    except Exception as e:
+        logger.error(f"Error clearing fact table: {str(e)}")
+        raise
+
+def prune_dimensions(conn):
+    """Delete datetime and location rows no longer referenced by any fact"""
+    try:
+        for table, key in (('dim_datetime', 'datetime_id'), ('dim_location', 'location_id')):
+            conn.execute(f"""
+                DELETE FROM {table}
+                WHERE NOT EXISTS (SELECT 1 FROM fact_trips f WHERE f.{key} = {table}.{key})
+            """)
+        logger.info("Successfully pruned unreferenced dimension rows")
+    except Exception as e:
+        logger.error(f"Error pruning dimensions: {str(e)}")
+        raise
+
+def create_enriched_staging(conn):
+    """Materialize cleaned staging rows once, with the helper columns every transform needs"""
+    try:
+        # Connection-local scratch table; nothing outside this run reads it
+        conn.execute("""
+            CREATE OR REPLACE TEMP TABLE staging_enriched AS
+            SELECT
+                *,
+                -- Surrogate keys assigned once here, so the fact build needs no joins back to the dims;
+                -- offset past existing ids so a reload never collides with the previous run's rows
+                dense_rank() OVER (ORDER BY pickup_datetime, dropoff_datetime)
+                    + (SELECT COALESCE(MAX(datetime_id), 0) FROM dim_datetime) as datetime_id,
+                dense_rank() OVER (ORDER BY coord_key)
+                    + (SELECT COALESCE(MAX(location_id), 0) FROM dim_location) as location_id
+            FROM (
+                SELECT
+                    *,
+                    -- Single integer key for each pickup/dropoff coordinate combination
+                    hash(pickup_latitude, pickup_longitude, dropoff_latitude, dropoff_longitude) as coord_key,
+                    date_part(['hour', 'day', 'month', 'year', 'dow'], pickup_datetime) as pickup_parts,
+                    date_part(['hour', 'day', 'month', 'year', 'dow'], dropoff_datetime) as dropoff_parts,
+                    date_diff('second', pickup_datetime, dropoff_datetime)::INTEGER as trip_duration,
+                    -- Payment and passenger ids are the source codes themselves (see the static dims)
+                    COALESCE(CASE WHEN payment_type BETWEEN 1 AND 6 THEN payment_type END, 0)::INTEGER as payment_id,
+                    passenger_count::INTEGER as passenger_id
+                FROM staging_uber_rides
+                WHERE pickup_datetime IS NOT NULL
+                    AND dropoff_datetime > pickup_datetime
+                    AND passenger_count BETWEEN 1 AND 8
+                    AND trip_distance >= 0
+            )
+        """)
+        logger.info("Successfully created enriched staging table")
+    except Exception as e:
+        logger.error(f"Error creating enriched staging table: {str(e)}")
+        raise
+
+def transform_location_dimension(conn):
     """Transform and load location dimension"""
-    conn = connect_to_duckdb()
-    
     try:
         conn.execute("""
             INSERT INTO dim_location (
                 location_id,
+                coord_key,
                 pickup_latitude,
                 pickup_longitude,
                 dropoff_latitude,
@@ -73,93 +132,33 @@ def transform_location_dimension():
                 dropoff_location_name
             )
             SELECT 
-                ROW_NUMBER() OVER () as location_id,
+                location_id,
+                coord_key,
                 pickup_latitude,
                 pickup_longitude,
                 dropoff_latitude,
                 dropoff_longitude,
                 'NYC Area' as pickup_location_name,  -- Could be enhanced with geocoding
                 'NYC Area' as dropoff_location_name  -- Could be enhanced with geocoding
-            FROM staging_uber_rides
-            GROUP BY 
-                pickup_latitude,
-                pickup_longitude,
-                dropoff_latitude,
-                dropoff_longitude
+            FROM (
+                -- Deduplicate on the location key, projecting only what's needed
+                SELECT DISTINCT ON (location_id)
+                    location_id,
+                    coord_key,
+                    pickup_latitude,
+                    pickup_longitude,
+                    dropoff_latitude,
+                    dropoff_longitude
+                FROM staging_enriched
+            )
         """)
         logger.info("Successfully transformed location dimension")
     except Exception as e:
         logger.error(f"Error transforming location dimension: {str(e)}")
         raise
-    finally:
-        conn.close()
 
-def transform_payment_dimension():
-    """Transform and load payment dimension"""
-    conn = connect_to_duckdb()
-    
-    try:
-        conn.execute("""
-            INSERT INTO dim_payment (
-                payment_id,
-                payment_type,
-                payment_name,
-                payment_description
-            )
-            SELECT 
-                ROW_NUMBER() OVER () as payment_id,
-                payment_type,
-                CASE payment_type
-                    WHEN 1 THEN 'Credit Card'
-                    WHEN 2 THEN 'Cash'
-                    WHEN 3 THEN 'No Charge'
-                    WHEN 4 THEN 'Dispute'
-                    ELSE 'Unknown'
-                END as payment_name,
-                CASE payment_type
-                    WHEN 1 THEN 'Payment by credit card'
-                    WHEN 2 THEN 'Cash payment'
-                    WHEN 3 THEN 'Free ride'
-                    WHEN 4 THEN 'Disputed charge'
-                    ELSE 'Unknown payment type'
-                END as payment_description
-            FROM staging_uber_rides
-            GROUP BY payment_type
-        """)
-        logger.info("Successfully transformed payment dimension")
-    except Exception as e:
-        logger.error(f"Error transforming payment dimension: {str(e)}")
-        raise
-    finally:
-        conn.close()
-
-def transform_passenger_dimension():
-    """Transform and load passenger dimension"""
-    conn = connect_to_duckdb()
-    
-    try:
-        conn.execute("""
-            INSERT INTO dim_passenger (
-                passenger_id,
-                passenger_count
-            )
-            SELECT 
-                ROW_NUMBER() OVER () as passenger_id,
-                passenger_count
-            FROM staging_uber_rides
-            GROUP BY passenger_count
-        """)
-        logger.info("Successfully transformed passenger dimension")
-    except Exception as e:
-        logger.error(f"Error transforming passenger dimension: {str(e)}")
-        raise
-    finally:
-        conn.close()
-
-def transform_fact_table():
+def transform_fact_table(conn):
     """Transform and load fact table"""
-    conn = connect_to_duckdb()
-    
     try:
         conn.execute("""
             INSERT INTO fact_trips (
@@ -175,79 +174,73 @@ def transform_fact_table():
                 trip_duration
             )
             SELECT 
-                ROW_NUMBER() OVER () as trip_id,
-                d.datetime_id,
-                l.location_id,
-                p.payment_id,
-                ps.passenger_id,
+                nextval('seq_fact_trips') as trip_id,
+                s.datetime_id,
+                s.location_id,
+                s.payment_id,
+                s.passenger_id,
                 s.trip_distance,
                 s.fare_amount,
                 s.tip_amount,
                 s.total_amount,
-                EXTRACT(EPOCH FROM (s.dropoff_datetime - s.pickup_datetime)) as trip_duration
-            FROM staging_uber_rides s
-            JOIN dim_datetime d ON 
-                d.pickup_datetime = s.pickup_datetime AND
-                d.dropoff_datetime = s.dropoff_datetime
-            JOIN dim_location l ON 
-                l.pickup_latitude = s.pickup_latitude AND
-                l.pickup_longitude = s.pickup_longitude AND
-                l.dropoff_latitude = s.dropoff_latitude AND
-                l.dropoff_longitude = s.dropoff_longitude
-            JOIN dim_payment p ON p.payment_type = s.payment_type
-            JOIN dim_passenger ps ON ps.passenger_count = s.passenger_count
+                s.trip_duration
+            FROM staging_enriched s
         """)
         logger.info("Successfully transformed fact table")
     except Exception as e:
         logger.error(f"Error transforming fact table: {str(e)}")
         raise
-    finally:
-        conn.close()
 
-def validate_transformations():
+def validate_transformations(conn):
     """Validate the transformed data"""
-    conn = connect_to_duckdb()
-    
     try:
-        # Check for orphaned records
-        orphaned_check = """
-            SELECT 'fact_trips' as table_name, COUNT(*) as orphaned_records
-            FROM fact_trips f
-            LEFT JOIN dim_datetime d ON f.datetime_id = d.datetime_id
-            WHERE d.datetime_id IS NULL
-            UNION ALL
-            SELECT 'fact_trips', COUNT(*)
-            FROM fact_trips f
-            LEFT JOIN dim_location l ON f.location_id = l.location_id
-            WHERE l.location_id IS NULL
-        """
+        # Check for orphaned records; each NOT EXISTS count is planned as a hash anti-join
+        orphaned_checks = {
+            'dim_datetime': """
+                SELECT COUNT(*) FROM fact_trips f
+                WHERE NOT EXISTS (SELECT 1 FROM dim_datetime d WHERE d.datetime_id = f.datetime_id)
+            """,
+            'dim_location': """
+                SELECT COUNT(*) FROM fact_trips f
+                WHERE NOT EXISTS (SELECT 1 FROM dim_location l WHERE l.location_id = f.location_id)
+            """
+        }
         
-        results = conn.execute(orphaned_check).fetchall()
-        for table, count in results:
+        for dimension, query in orphaned_checks.items():
+            count = conn.execute(query).fetchone()[0]
             if count > 0:
-                raise ValueError(f"Found {count} orphaned records in {table}")
+                raise ValueError(f"Found {count} orphaned records in fact_trips missing from {dimension}")
         
         logger.info("Data validation successful")
         
     except Exception as e:
         logger.error(f"Data validation failed: {str(e)}")
         raise
-    finally:
-        conn.close()
 
 def main():
     """Execute all transformation steps"""
+    # Process-wide connection keeps the database open and its cache warm
+    conn = get_conn()
+    
+    # Run every step in one transaction: a single commit, and nothing is left half-loaded on failure
+    conn.execute("BEGIN TRANSACTION")
     try:
-        transform_datetime_dimension()
-        transform_location_dimension()
-        transform_payment_dimension()
-        transform_passenger_dimension()
-        transform_fact_table()
-        validate_transformations()
-        logger.info("All transformations completed successfully")
+        clear_fact_table(conn)
+        create_enriched_staging(conn)
+        transform_datetime_dimension(conn)
+        transform_location_dimension(conn)
+        transform_fact_table(conn)
+        validate_transformations(conn)
+        conn.execute("COMMIT")
     except Exception as e:
+        conn.execute("ROLLBACK")
         logger.error(f"Transformation process failed: {str(e)}")
         raise
+    
+    # DuckDB can't delete referenced dimension rows in the transaction that deleted their
+    # facts, so the previous run's dimension rows are dropped once the reload is committed
+    prune_dimensions(conn)
+    logger.info("All transformations completed successfully")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
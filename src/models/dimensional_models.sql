@@ -1,4 +1,7 @@
 
+-- Sequence for fact surrogate keys; dimension keys are ranked from staging
+CREATE SEQUENCE IF NOT EXISTS seq_fact_trips START 1;
+
 -- Create dimension tables
 CREATE TABLE IF NOT EXISTS dim_datetime (
     datetime_id INTEGER PRIMARY KEY,
@@ -18,6 +21,7 @@ CREATE TABLE IF NOT EXISTS dim_datetime (
 
 CREATE TABLE IF NOT EXISTS dim_location (
     location_id INTEGER PRIMARY KEY,
+    coord_key UBIGINT,  -- hash of the four coordinates, used as the join key
     pickup_latitude DOUBLE,
     pickup_longitude DOUBLE,
     dropoff_latitude DOUBLE,
@@ -35,9 +39,23 @@ CREATE TABLE IF NOT EXISTS dim_payment (
 
 CREATE TABLE IF NOT EXISTS dim_passenger (
     passenger_id INTEGER PRIMARY KEY,
-    passenger_count INTEGER
+    passenger_count TINYINT
 );
 
+-- Payment and passenger dimensions are small and fixed; ids equal the source codes,
+-- with payment id 0 catching missing or unrecognised payment codes
+INSERT OR IGNORE INTO dim_payment VALUES
+    (0, NULL, 'Unknown', 'Unknown payment type'),
+    (1, '1', 'Credit Card', 'Payment by credit card'),
+    (2, '2', 'Cash', 'Cash payment'),
+    (3, '3', 'No Charge', 'Free ride'),
+    (4, '4', 'Dispute', 'Disputed charge'),
+    (5, '5', 'Unknown', 'Unknown payment type'),
+    (6, '6', 'Unknown', 'Unknown payment type');
+
+INSERT OR IGNORE INTO dim_passenger VALUES
+    (1, 1), (2, 2), (3, 3), (4, 4), (5, 5), (6, 6), (7, 7), (8, 8);
+
 -- Create fact table
 CREATE TABLE IF NOT EXISTS fact_trips (
     trip_id INTEGER PRIMARY KEY,
@@ -45,10 +63,10 @@ CREATE TABLE IF NOT EXISTS fact_trips (
     location_id INTEGER REFERENCES dim_location(location_id),
     payment_id INTEGER REFERENCES dim_payment(payment_id),
     passenger_id INTEGER REFERENCES dim_passenger(passenger_id),
-    trip_distance DOUBLE,
-    fare_amount DOUBLE,
-    tip_amount DOUBLE,
-    total_amount DOUBLE,
+    trip_distance REAL,
+    fare_amount REAL,
+    tip_amount REAL,
+    total_amount REAL,
     trip_duration INTEGER,
     FOREIGN KEY (datetime_id) REFERENCES dim_datetime(datetime_id),
     FOREIGN KEY (location_id) REFERENCES dim_location(location_id),
@@ -56,8 +74,9 @@ CREATE TABLE IF NOT EXISTS fact_trips (
     FOREIGN KEY (passenger_id) REFERENCES dim_passenger(passenger_id)
 );
 
--- Create analytics views
-CREATE VIEW IF NOT EXISTS vw_hourly_fares AS
+-- Create analytics views over the live tables (the load step exports TEMP versions of
+-- these over a per-run join of the fact table to its dimensions)
+CREATE OR REPLACE VIEW vw_hourly_fares AS
 SELECT 
     d.pickup_hour,
     AVG(f.fare_amount) as avg_fare,
@@ -67,18 +86,18 @@ JOIN dim_datetime d ON f.datetime_id = d.datetime_id
 GROUP BY d.pickup_hour
 ORDER BY d.pickup_hour;
 
-CREATE VIEW IF NOT EXISTS vw_popular_locations AS
+CREATE OR REPLACE VIEW vw_popular_locations AS
 SELECT 
-    l.pickup_latitude,
-    l.pickup_longitude,
+    ROUND(l.pickup_latitude, 4) as pickup_latitude,  -- ~11m grid buckets
+    ROUND(l.pickup_longitude, 4) as pickup_longitude,
     COUNT(*) as num_pickups,
     AVG(f.fare_amount) as avg_fare
 FROM fact_trips f
 JOIN dim_location l ON f.location_id = l.location_id
-GROUP BY l.pickup_latitude, l.pickup_longitude
+GROUP BY ROUND(l.pickup_latitude, 4), ROUND(l.pickup_longitude, 4)
 ORDER BY num_pickups DESC;
 
-CREATE VIEW IF NOT EXISTS vw_payment_analysis AS
+CREATE OR REPLACE VIEW vw_payment_analysis AS
 SELECT 
     p.payment_name,
     COUNT(*) as num_trips,
@@ -86,4 +105,17 @@ SELECT
     AVG(f.tip_amount) as avg_tip
 FROM fact_trips f
 JOIN dim_payment p ON f.payment_id = p.payment_id
-GROUP BY p.payment_name;
\ No newline at end of file
+GROUP BY p.payment_name;
+
+CREATE OR REPLACE VIEW vw_daily_stats AS
+SELECT 
+    d.pickup_year,
+    d.pickup_month,
+    d.pickup_day,
+    COUNT(*) as num_trips,
+    AVG(f.fare_amount) as avg_fare,
+    SUM(f.total_amount) as total_revenue
+FROM fact_trips f
+JOIN dim_datetime d ON f.datetime_id = d.datetime_id
+GROUP BY d.pickup_year, d.pickup_month, d.pickup_day
+ORDER BY d.pickup_year, d.pickup_month, d.pickup_day;